@@ -0,0 +1,26 @@
+"""
+Shared HTTP session for the news notifier. Reuses TCP/TLS connections across
+TradingEconomics, RSS and Discord requests and retries transient failures.
+"""
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+def _build_session() -> requests.Session:
+    """Session with a pooled adapter; GETs are retried with backoff on 429/5xx."""
+    retry = Retry(
+        total=3,
+        backoff_factor=0.5,
+        status_forcelist=[429, 500, 502, 503, 504],
+        raise_on_status=False,  # Hand the last response back instead of raising
+    )
+    adapter = HTTPAdapter(pool_connections=16, pool_maxsize=32, max_retries=retry)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+SESSION = _build_session()
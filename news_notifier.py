@@ -3,6 +3,8 @@ News notifier: fetches from TradingEconomics API and RSS feeds (WSJ, NYT, FT, Re
 deduplicates by article ID, and posts new items to a Discord webhook.
 """
 
+import functools
+import itertools
 import json
 import logging
 import os
@@ -12,16 +14,67 @@ from pathlib import Path
 import requests
 from dotenv import load_dotenv
 
-from rss_feeds import fetch_rss_articles
-
-load_dotenv()
+from http_client import SESSION
+from rss_feeds import (
+    RSS_FEEDS,
+    ArticleRecord,
+    fetch_rss_articles,
+    load_feed_cache,
+    save_feed_cache,
+)
 
 logger = logging.getLogger(__name__)
 
 TE_BASE_URL = "https://tradingeconomics.com"
 TE_API_URL = "https://api.tradingeconomics.com/news"
 MAX_SEEN_IDS = 3000  # Increased for multi-source
+STATE_VERSION = 2  # v2: all ids already carry a source prefix (te:, rss:)
 DEFAULT_LIMIT = 20
+# Discord allows ~30 webhook requests per 60s; keep 2 tokens of headroom.
+DISCORD_BUCKET_CAPACITY = 28
+DISCORD_BUCKET_REFILL_PER_SEC = 28 / 60
+DISCORD_MAX_ATTEMPTS = 3
+DISCORD_OK = (200, 204)
+DISCORD_WEBHOOK_GONE = (401, 403, 404)  # Webhook URL invalid or deleted
+DISCORD_MAX_EMBEDS = 10  # Per webhook message
+DISCORD_EMBED_TITLE_MAX = 256
+DISCORD_CONTENT_MAX = 2000
+
+
+class TokenBucket:
+    """
+    Simple token-bucket rate limiter. Bursts of up to `capacity` calls go through
+    immediately; after that acquire() blocks until a token has been refilled.
+    """
+
+    def __init__(self, capacity: float, refill_per_sec: float) -> None:
+        self.capacity = capacity
+        self.refill_per_sec = refill_per_sec
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.refill_per_sec)
+        self.updated = now
+
+    def acquire(self) -> None:
+        """Take one token, sleeping until one is available."""
+        self._refill()
+        if self.tokens < 1:
+            time.sleep((1 - self.tokens) / self.refill_per_sec)
+            self._refill()
+        self.tokens -= 1
+
+
+# One bucket per process, so the webhook budget carries over between --loop ticks
+_DISCORD_BUCKET = TokenBucket(DISCORD_BUCKET_CAPACITY, DISCORD_BUCKET_REFILL_PER_SEC)
+
+
+@functools.lru_cache(maxsize=1)
+def init_env() -> None:
+    """Load .env into the environment. Runs once per process; later calls are no-ops."""
+    load_dotenv()
 
 
 def get_te_api_key() -> str:
@@ -41,35 +94,54 @@ def get_state_path() -> Path:
     return base / "state" / "seen_ids.json"
 
 
-def load_seen_ids(state_path: Path) -> set[str]:
-    """Load set of seen article IDs from state file. Migrates legacy TE ids to te: prefix."""
+def load_seen_ids(state_path: Path) -> dict[str, None]:
+    """
+    Load seen article IDs from state file, oldest first. Returned as a dict used as an
+    insertion-ordered set, so trimming can drop the oldest IDs. Migrates legacy TE ids
+    to te: prefix; files saved as STATE_VERSION 2 or later skip the migration.
+    """
     if not state_path.exists():
-        return set()
+        return {}
     try:
         with open(state_path, "r", encoding="utf-8") as f:
             data = json.load(f)
         ids = data.get("ids", data) if isinstance(data, dict) else data
-        result: set[str] = set()
-        for i in ids:
-            s = str(i)
-            if s and ":" not in s and s.isdigit():
-                result.add(f"te:{s}")  # Migrate legacy TE ids
-            else:
-                result.add(s)
-        return result
-    except (json.JSONDecodeError, OSError) as e:
+        version = data.get("version", 1) if isinstance(data, dict) else 1
+        # A malformed version is treated as legacy: the migration handles any id list
+        if isinstance(version, int) and version >= STATE_VERSION:
+            return dict.fromkeys(map(str, ids))
+        # Migrate legacy TE ids (bare digits) to te: prefix
+        return {
+            f"te:{s}" if (s := str(i)) and ":" not in s and s.isdigit() else s: None
+            for i in ids
+        }
+    except (json.JSONDecodeError, OSError, TypeError) as e:
         logger.warning("Could not load state file %s: %s", state_path, e)
-        return set()
+        return {}
 
 
-def save_seen_ids(state_path: Path, seen_ids: set[str]) -> None:
-    """Persist seen IDs, keeping at most MAX_SEEN_IDS. Creates state dir if needed."""
+def save_seen_ids(state_path: Path, seen_ids: dict[str, None]) -> None:
+    """
+    Persist seen IDs, keeping the MAX_SEEN_IDS most recently added. Creates state dir if needed.
+    Writes to a temp file and renames it over the old one, so an interrupted save
+    never leaves a truncated state file behind.
+    """
     state_path.parent.mkdir(parents=True, exist_ok=True)
     ids_list = list(seen_ids)
     if len(ids_list) > MAX_SEEN_IDS:
         ids_list = ids_list[-MAX_SEEN_IDS:]
-    with open(state_path, "w", encoding="utf-8") as f:
-        json.dump({"ids": ids_list}, f, indent=0)
+    tmp_path = state_path.with_suffix(".json.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"version": STATE_VERSION, "ids": ids_list}, f, separators=(",", ":"))
+    os.replace(tmp_path, state_path)
+
+
+def trim_seen_ids(seen_ids: dict[str, None]) -> None:
+    """Drop the oldest IDs in place so at most MAX_SEEN_IDS remain (as save_seen_ids keeps)."""
+    excess = len(seen_ids) - MAX_SEEN_IDS
+    if excess > 0:
+        for aid in list(itertools.islice(seen_ids, excess)):
+            del seen_ids[aid]
 
 
 def fetch_te_news(api_key: str, limit: int = DEFAULT_LIMIT) -> list[dict]:
@@ -79,7 +151,7 @@ def fetch_te_news(api_key: str, limit: int = DEFAULT_LIMIT) -> list[dict]:
     """
     params = {"c": api_key, "f": "json", "limit": limit}
     try:
-        r = requests.get(TE_API_URL, params=params, timeout=15)
+        r = SESSION.get(TE_API_URL, params=params, timeout=15)
         r.raise_for_status()
         data = r.json()
         return data if isinstance(data, list) else []
@@ -99,6 +171,64 @@ def article_full_url(relative_url: str) -> str:
     return TE_BASE_URL.rstrip("/") + path
 
 
+def _retry_after_seconds(response: requests.Response) -> float:
+    """Seconds to wait after a Discord 429, from the Retry-After header or JSON body."""
+    header = response.headers.get("Retry-After")
+    if header:
+        try:
+            return max(0.0, float(header))
+        except ValueError:
+            pass
+    try:
+        return max(0.0, float(response.json().get("retry_after", 1)))
+    except (ValueError, AttributeError):
+        return 1.0
+
+
+def _embed(title: str, link: str, description: str | None, source: str | None) -> dict:
+    """Build one Discord embed for an article; description is cut to a 200-char snippet."""
+    prefix = f"[{source}] " if source else ""
+    embed = {"title": f"{prefix}{title}"[:DISCORD_EMBED_TITLE_MAX], "url": link, "color": 3447003}
+    if description:
+        snippet = (description[:200] + "…") if len(description) > 200 else description
+        embed["description"] = snippet
+    return embed
+
+
+def _post_discord(webhook_url: str, payload: dict) -> int | None:
+    """
+    POST a payload to the Discord webhook. Returns the final HTTP status, or None if
+    the request itself failed. On HTTP 429, waits for the time Discord asks for and retries.
+    """
+    for _ in range(DISCORD_MAX_ATTEMPTS):
+        try:
+            r = SESSION.post(webhook_url, json=payload, timeout=10)
+        except requests.RequestException as e:
+            logger.warning("Discord webhook request failed: %s", e)
+            return None
+        if r.status_code in DISCORD_OK:
+            return r.status_code
+        if r.status_code != 429:
+            logger.warning("Discord webhook returned %s: %s", r.status_code, r.text[:200])
+            return r.status_code
+        wait = _retry_after_seconds(r)
+        logger.warning("Discord webhook rate limited; retrying in %.2fs.", wait)
+        time.sleep(wait)
+    logger.warning("Discord webhook still rate limited after %s attempts.", DISCORD_MAX_ATTEMPTS)
+    return 429
+
+
+def _notification_payload(
+    title: str, link: str, description: str | None, source: str | None
+) -> dict:
+    """Payload for a single notification: content (title + link) and optionally an embed."""
+    prefix = f"[{source}] " if source else ""
+    payload = {"content": f"{prefix}{title}\n{link}"}
+    if description:
+        payload["embeds"] = [_embed(title, link, description, source)]
+    return payload
+
+
 def send_discord_notification(
     webhook_url: str,
     title: str,
@@ -110,29 +240,23 @@ def send_discord_notification(
     POST a single notification to the Discord webhook. Uses content (title + link)
     and optionally an embed. Returns True on success.
     """
-    prefix = f"[{source}] " if source else ""
-    content = f"{prefix}{title}\n{link}"
-    payload = {"content": content}
-    embed_title = f"{prefix}{title}" if prefix else title
-    if description:
-        snippet = (description[:200] + "…") if len(description) > 200 else description
-        payload["embeds"] = [
-            {
-                "title": embed_title,
-                "url": link,
-                "description": snippet,
-                "color": 3447003,
-            }
-        ]
-    try:
-        r = requests.post(webhook_url, json=payload, timeout=10)
-        if r.status_code in (200, 204):
-            return True
-        logger.warning("Discord webhook returned %s: %s", r.status_code, r.text[:200])
-        return False
-    except requests.RequestException as e:
-        logger.warning("Discord webhook request failed: %s", e)
-        return False
+    payload = _notification_payload(title, link, description, source)
+    return _post_discord(webhook_url, payload) in DISCORD_OK
+
+
+def send_discord_batch(webhook_url: str, items: list[ArticleRecord]) -> int | None:
+    """
+    POST up to DISCORD_MAX_EMBEDS (title, link, description, source) records as one
+    message, one embed each. Content lists the titles so phone push notifications
+    still show what arrived. Returns the HTTP status (None if the request failed), so
+    callers can tell a rejected payload (4xx) from a transient failure.
+    """
+    embeds = [
+        _embed(title, link, description, source)
+        for title, link, description, source in items[:DISCORD_MAX_EMBEDS]
+    ]
+    content = "\n".join(e["title"] for e in embeds)[:DISCORD_CONTENT_MAX]
+    return _post_discord(webhook_url, {"content": content, "embeds": embeds})
 
 
 def run(
@@ -141,56 +265,129 @@ def run(
     limit: int = DEFAULT_LIMIT,
     state_path: Path | None = None,
     rss_enabled: bool | None = None,
-) -> None:
+    seen: dict[str, None] | None = None,
+) -> int:
     """
     Main flow: load seen IDs, fetch TE + RSS news, for each new article post to Discord
-    and add ID to seen set, then persist seen IDs.
+    and, once the post succeeds, add ID to seen set, then persist seen IDs. Articles
+    that failed to post stay unseen and are retried next run. Returns the number of
+    articles sent.
+    If `seen` is passed (e.g. kept in memory across --loop ticks), it is updated in
+    place and saved only if this run added IDs. Seen IDs are always saved before the
+    feed cache, so a crash in between refetches feeds rather than losing articles.
     """
+    init_env()
     if rss_enabled is None:
         rss_enabled = os.getenv("RSS_ENABLED", "true").lower() not in ("false", "0", "no")
     webhook = (discord_webhook_url or get_discord_webhook_url()).strip()
     if not webhook:
         logger.error("DISCORD_WEBHOOK_URL is not set. Set it in .env or pass discord_webhook_url.")
-        return
+        return 0
 
     key = te_api_key or get_te_api_key()
     path = state_path or get_state_path()
-    seen = load_seen_ids(path)
+    owns_state = seen is None
+    if seen is None:
+        seen = load_seen_ids(path)
+    seen_before = len(seen)
 
     # Fetch TradingEconomics articles
+    # Articles are kept as parallel lists: IDs (for dedup) and (title, link, description, source)
     te_items = fetch_te_news(key, limit=limit)
-    articles: list[dict] = []
+    ids: list[str] = []
+    records: list[ArticleRecord] = []
     for item in te_items:
         aid = item.get("id")
         if aid is None:
             continue
         aid_str = f"te:{aid}"
+        if aid_str in seen:
+            continue
         rel_url = item.get("url") or ""
         link = article_full_url(rel_url)
-        articles.append({
-            "id": aid_str,
-            "title": item.get("title") or "No title",
-            "link": link,
-            "description": item.get("description"),
-            "source": "TradingEconomics",
-        })
+        ids.append(aid_str)
+        records.append((
+            item.get("title") or "No title",
+            link,
+            item.get("description"),
+            "TradingEconomics",
+        ))
 
     # Fetch RSS articles
+    feed_cache_path = path.with_name("feed_cache.json")
+    feed_cache: dict[str, dict] = {}
+    feed_cache_updates: dict[str, dict] = {}
     if rss_enabled:
-        rss_items = fetch_rss_articles(limit_per_feed=15)
-        articles.extend(rss_items)
+        feed_cache = load_feed_cache(feed_cache_path)
+        rss_ids, rss_records, feed_cache_updates = fetch_rss_articles(
+            limit_per_feed=15, cache=feed_cache, seen=seen
+        )
+        ids.extend(rss_ids)
+        records.extend(rss_records)
 
-    # Dedupe and notify (with delay to avoid Discord rate limit ~30/min per webhook)
-    for item in articles:
-        aid = item.get("id", "")
-        if not aid or aid in seen:
+    # Dedupe: articles with a description are batched (up to 10 embeds per message),
+    # the rest go out as single title + link posts
+    pending: set[str] = set()
+    batched: list[tuple[str, ArticleRecord]] = []
+    singles: list[tuple[str, ArticleRecord]] = []
+    for i, aid in enumerate(ids):
+        if aid in seen or aid in pending:
             continue
-        title = item.get("title") or "No title"
-        link = item.get("link") or ""
-        description = item.get("description")
-        source = item.get("source")
-        send_discord_notification(webhook, title, link, description, source=source)
-        seen.add(aid)
-        time.sleep(1)  # ~1/sec to stay under Discord webhook rate limit (~30/min)
-
-    save_seen_ids(path, seen)
+        pending.add(aid)
+        record = records[i]
+        (batched if record[2] else singles).append((aid, record))
+
+    # Notify, throttled to Discord's webhook rate limit (~30/min). IDs are marked seen
+    # only after their post succeeds, so a transient failure (or a kill mid-run) never
+    # drops them; an article Discord rejects outright is marked seen so it isn't retried forever.
+    sent = 0
+    webhook_gone = False
+    for i in range(0, len(batched), DISCORD_MAX_EMBEDS):
+        chunk = batched[i:i + DISCORD_MAX_EMBEDS]
+        _DISCORD_BUCKET.acquire()
+        status = send_discord_batch(webhook, [record for _, record in chunk])
+        if status in DISCORD_OK:
+            for aid, _ in chunk:
+                seen[aid] = None
+            sent += len(chunk)
+        elif status == 400:
+            # Discord rejected the payload; resend one by one so a bad record can't sink the rest
+            logger.warning("Discord rejected a batch of %s; sending them one by one.", len(chunk))
+            singles.extend(chunk)
+        elif status in DISCORD_WEBHOOK_GONE:
+            webhook_gone = True
+            break
+    if not webhook_gone:
+        for aid, (title, link, description, source) in singles:
+            _DISCORD_BUCKET.acquire()
+            status = _post_discord(
+                webhook, _notification_payload(title, link, description, source)
+            )
+            if status in DISCORD_OK:
+                seen[aid] = None
+                sent += 1
+            elif status in DISCORD_WEBHOOK_GONE:
+                webhook_gone = True
+                break
+            elif status is not None and 400 <= status < 500 and status != 429:
+                logger.warning("Discord rejected %s (%s); not retrying it.", link, status)
+                seen[aid] = None
+    if webhook_gone:
+        logger.error(
+            "Discord webhook is invalid or was deleted; check DISCORD_WEBHOOK_URL. "
+            "Unsent articles will be retried next run."
+        )
+    failed_sources = {record[3] for aid, record in batched + singles if aid not in seen}
+
+    if owns_state or len(seen) != seen_before:
+        save_seen_ids(path, seen)
+    # Only now remember what was fetched, so a crash before this point refetches the feeds.
+    # Feeds with unsent articles keep their old entry and are fetched and parsed again.
+    failed_urls = {url for source_name, url, _ in RSS_FEEDS if source_name in failed_sources}
+    feed_cache_updates = {
+        url: entry for url, entry in feed_cache_updates.items() if url not in failed_urls
+    }
+    if feed_cache_updates:
+        feed_cache.update(feed_cache_updates)
+        save_feed_cache(feed_cache_path, feed_cache)
+    return sent
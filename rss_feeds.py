@@ -1,33 +1,64 @@
 """
 RSS feed fetcher for news notifier. Fetches articles from WSJ, NYT, FT, Reuters.
-Returns normalized article dicts: {id, title, link, description, source}.
+Returns article IDs and (title, link, description, source) records as parallel lists.
 """
 
 import hashlib
+import html
+import json
 import logging
+import os
 import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from urllib.parse import urljoin, urlparse
 
 import feedparser
+import requests
+from lxml import etree
+
+from http_client import SESSION
 
 logger = logging.getLogger(__name__)
 
-RSS_FEEDS: list[tuple[str, str]] = [
-    # (source_name, feed_url)
-    ("WSJ Markets", "https://feeds.content.dowjones.io/public/rss/RSSMarketsMain"),
-    ("WSJ Economy", "https://feeds.content.dowjones.io/public/rss/socialeconomyfeed"),
-    ("WSJ US Business", "https://feeds.content.dowjones.io/public/rss/WSJcomUSBusiness"),
-    ("NYT Business", "https://rss.nytimes.com/services/xml/rss/nyt/Business.xml"),
-    ("NYT World", "https://rss.nytimes.com/services/xml/rss/nyt/World.xml"),
-    ("NYT Technology", "https://rss.nytimes.com/services/xml/rss/nyt/Technology.xml"),
-    ("FT Home", "https://www.ft.com/rss/home"),
-    ("FT World", "https://www.ft.com/world?format=rss"),
-    ("FT Global Economy", "https://www.ft.com/global-economy?format=rss"),
+# (title, link, description, source)
+ArticleRecord = tuple[str, str, str | None, str]
+
+RSS_FEEDS: list[tuple[str, str, int]] = [
+    # (source_name, feed_url, ttl_seconds) — TTL is the minimum time between fetches
+    ("WSJ Markets", "https://feeds.content.dowjones.io/public/rss/RSSMarketsMain", 300),
+    ("WSJ Economy", "https://feeds.content.dowjones.io/public/rss/socialeconomyfeed", 600),
+    ("WSJ US Business", "https://feeds.content.dowjones.io/public/rss/WSJcomUSBusiness", 600),
+    ("NYT Business", "https://rss.nytimes.com/services/xml/rss/nyt/Business.xml", 900),
+    ("NYT World", "https://rss.nytimes.com/services/xml/rss/nyt/World.xml", 900),
+    ("NYT Technology", "https://rss.nytimes.com/services/xml/rss/nyt/Technology.xml", 900),
+    ("FT Home", "https://www.ft.com/rss/home", 1800),
+    ("FT World", "https://www.ft.com/world?format=rss", 1800),
+    ("FT Global Economy", "https://www.ft.com/global-economy?format=rss", 3600),
     # Reuters: no reliable public RSS; add via rss.app or similar if needed.
 ]
 
+USER_AGENT = "NewsNotifier/1.0"
+FETCH_TIMEOUT = 10
+MAX_WORKERS = 6
+MAX_PER_HOST = 2  # Don't open more than this many simultaneous connections to one host
+TTL_SLACK = 60  # Feeds are due this many seconds early, so tick jitter doesn't skip one
+
+_TAG_RE = re.compile(r"<[^>]+>")
+_ATOM_NS = "{http://www.w3.org/2005/Atom}"
+_RSS1_NS = "{http://purl.org/rss/1.0/}"
+
 
 def _article_id(source: str, link: str) -> str:
-    """Generate a stable unique ID for an RSS article. Uses hash of link."""
+    """Generate a stable unique ID for an RSS article. Uses a 64-bit BLAKE2b hash of link."""
+    h = hashlib.blake2b(link.encode("utf-8"), digest_size=8).hexdigest()
+    return f"rss:{source}:{h}"
+
+
+def _legacy_article_id(source: str, link: str) -> str:
+    """ID format used before the switch to BLAKE2b (MD5 of link), still present in old state."""
     h = hashlib.md5(link.encode("utf-8")).hexdigest()
     return f"rss:{source}:{h}"
 
@@ -37,38 +68,216 @@ def _normalize_source(name: str) -> str:
     return name.lower().replace(" ", "-")
 
 
-def fetch_rss_articles(limit_per_feed: int = 15) -> list[dict]:
+def load_feed_cache(cache_path: Path | None) -> dict[str, dict]:
+    """Load per-feed {url: {etag, last_modified, body_sha, fetched_at}} map."""
+    if cache_path is None or not cache_path.exists():
+        return {}
+    try:
+        with open(cache_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return data if isinstance(data, dict) else {}
+    except (json.JSONDecodeError, OSError) as e:
+        logger.warning("Could not load feed cache %s: %s", cache_path, e)
+        return {}
+
+
+def save_feed_cache(cache_path: Path | None, cache: dict[str, dict]) -> None:
+    """Persist the feed cache atomically (temp file + rename). Creates state dir if needed."""
+    if cache_path is None:
+        return
+    try:
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = cache_path.with_suffix(".json.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(cache, f, separators=(",", ":"))
+        os.replace(tmp_path, cache_path)
+    except OSError as e:
+        logger.warning("Could not save feed cache %s: %s", cache_path, e)
+
+
+def _fetch_one(
+    source_name: str,
+    url: str,
+    cached: dict,
+    host_limits: dict[str, threading.Semaphore],
+) -> tuple[bytes | None, dict | None]:
+    """
+    Download one feed body with a conditional GET. Returns (body, cache_entry);
+    body is None when the feed is unchanged (304 or same content) or the request failed,
+    cache_entry is None when the request failed.
+    """
+    headers = {"User-Agent": USER_AGENT}
+    if cached.get("etag"):
+        headers["If-None-Match"] = cached["etag"]
+    if cached.get("last_modified"):
+        headers["If-Modified-Since"] = cached["last_modified"]
+    with host_limits[urlparse(url).netloc]:
+        try:
+            r = SESSION.get(url, headers=headers, timeout=FETCH_TIMEOUT)
+            if r.status_code == 304:
+                return None, {**cached, "fetched_at": time.time()}
+            r.raise_for_status()
+        except requests.RequestException as e:
+            logger.warning("Failed to fetch RSS %s (%s): %s", source_name, url, e)
+            return None, None
+    entry = {
+        "etag": r.headers.get("ETag"),
+        "last_modified": r.headers.get("Last-Modified"),
+        "body_sha": hashlib.sha256(r.content).hexdigest(),
+        "fetched_at": time.time(),
+    }
+    if entry["body_sha"] == cached.get("body_sha"):
+        return None, entry
+    return r.content, entry
+
+
+def _strip_html(text: str) -> str:
+    """Remove HTML tags and decode entities (e.g. &amp;) from a feed summary."""
+    if "<" in text:
+        text = _TAG_RE.sub("", text)
+    return html.unescape(text) if "&" in text else text
+
+
+def _text(el: etree._Element | None) -> str | None:
+    """All text inside an element, including children (e.g. an Atom type="xhtml" <div>)."""
+    return "".join(el.itertext()) if el is not None else None
+
+
+def _atom_link(entry: etree._Element) -> str | None:
+    """href of an Atom entry's alternate link (or first link without rel)."""
+    for link in entry.iterfind(f"{_ATOM_NS}link"):
+        if link.get("rel", "alternate") == "alternate":
+            return link.get("href")
+    return None
+
+
+def _rss_link(item: etree._Element, ns: str) -> str | None:
+    """<link> of an RSS item, or its <guid> when that is a permalink (as feedparser does)."""
+    link = item.findtext(f"{ns}link")
+    if link and link.strip():
+        return link
+    guid = item.find(f"{ns}guid")
+    if guid is not None and guid.get("isPermaLink", "true").lower() != "false":
+        return guid.text
+    return None
+
+
+def _parse_feed_lxml(body: bytes, limit: int) -> list[dict]:
+    """
+    Extract {title, link, summary} from RSS 2.0, RSS 1.0 or Atom with lxml. Raises
+    ValueError if the body was not well-formed: lxml's recovery silently truncates
+    text (e.g. at HTML entities like &nbsp;), so such feeds are left to feedparser.
+    """
+    parser = etree.XMLParser(recover=True, huge_tree=False, resolve_entities=False, no_network=True)
+    root = etree.fromstring(body, parser=parser)
+    errors = parser.error_log.filter_from_errors()
+    if errors:
+        raise ValueError(f"feed is not well-formed XML: {errors[0].message}")
+    if root is None:
+        return []
+    items = root.findall("channel/item") or root.findall(f"{_RSS1_NS}item")
+    if items:
+        ns = "" if items[0].tag == "item" else _RSS1_NS
+        return [
+            {
+                "title": _text(item.find(f"{ns}title")),
+                "link": _rss_link(item, ns),
+                "summary": _text(item.find(f"{ns}description")),
+            }
+            for item in items[:limit]
+        ]
+    return [
+        {
+            "title": _text(entry.find(f"{_ATOM_NS}title")),
+            "link": _atom_link(entry),
+            "summary": (
+                _text(entry.find(f"{_ATOM_NS}summary")) or _text(entry.find(f"{_ATOM_NS}content"))
+            ),
+        }
+        for entry in root.findall(f"{_ATOM_NS}entry")[:limit]
+    ]
+
+
+def _parse_feed(body: bytes, limit: int) -> list[dict]:
     """
-    Fetch articles from all configured RSS feeds. Returns list of dicts:
-    {id, title, link, description, source}.
+    Parse a feed body into at most `limit` {title, link, summary} dicts. Uses lxml;
+    falls back to feedparser for feeds that are not well-formed XML or have no entries.
     """
-    articles: list[dict] = []
-    for source_name, url in RSS_FEEDS:
+    try:
+        entries = _parse_feed_lxml(body, limit)
+        if entries:
+            return entries
+    except (etree.LxmlError, ValueError) as e:
+        logger.debug("lxml could not parse feed, falling back to feedparser: %s", e)
+    parsed = feedparser.parse(body)
+    return [
+        {"title": e.get("title"), "link": e.get("link"), "summary": e.get("summary")}
+        for e in parsed.entries[:limit]
+    ]
+
+
+def fetch_rss_articles(
+    limit_per_feed: int = 15,
+    cache: dict[str, dict] | None = None,
+    seen: dict[str, None] | None = None,
+) -> tuple[list[str], list[ArticleRecord], dict[str, dict]]:
+    """
+    Fetch articles from all configured RSS feeds. Returns (ids, records, cache_updates):
+    parallel lists of article IDs and (title, link, description, source) tuples, so
+    callers can dedupe on the ID column alone, plus new feed cache entries by URL.
+    Feeds are downloaded concurrently, then parsed one by one on the calling thread.
+    With a cache (see load_feed_cache), feeds fetched less than their TTL ago are
+    skipped and the rest are fetched with ETag/Last-Modified validators, so unchanged
+    feeds are not parsed. cache is not modified: merge cache_updates into it and call
+    save_feed_cache only once the returned articles have been handled, or a crash in
+    between would lose them. Entries whose ID is already in `seen` are dropped before
+    their title/summary are processed.
+    """
+    cache = cache or {}
+    now = time.time()
+    due = [
+        (source_name, url)
+        for source_name, url, ttl in RSS_FEEDS
+        if now - cache.get(url, {}).get("fetched_at", 0) >= ttl - TTL_SLACK
+    ]
+    host_limits = {
+        urlparse(url).netloc: threading.Semaphore(MAX_PER_HOST) for _, url in due
+    }
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as pool:
+        results = list(pool.map(
+            lambda feed: _fetch_one(feed[0], feed[1], cache.get(feed[1], {}), host_limits),
+            due,
+        ))
+
+    ids: list[str] = []
+    records: list[ArticleRecord] = []
+    cache_updates: dict[str, dict] = {}
+    for (source_name, url), (body, cache_entry) in zip(due, results):
+        if cache_entry is not None:
+            cache_updates[url] = cache_entry
+        if body is None:
+            continue
         try:
-            parsed = feedparser.parse(url, request_headers={"User-Agent": "NewsNotifier/1.0"})
-            if parsed.bozo and not parsed.entries:
+            entries = _parse_feed(body, limit_per_feed)
+            if not entries:
                 logger.warning("RSS feed %s (%s) parse error or empty.", source_name, url)
                 continue
             slug = _normalize_source(source_name)
-            for i, entry in enumerate(parsed.entries):
-                if i >= limit_per_feed:
-                    break
+            for entry in entries:
                 link = (entry.get("link") or "").strip()
                 if not link:
                     continue
-                title = (entry.get("title") or "No title").strip()
-                description = None
-                if hasattr(entry, "summary") and entry.summary:
-                    desc = re.sub(r"<[^>]+>", "", str(entry.summary))
-                    description = (desc or "").strip() or None
+                link = urljoin(url, link)  # Resolve relative item links against the feed URL
                 aid = _article_id(slug, link)
-                articles.append({
-                    "id": aid,
-                    "title": title,
-                    "link": link,
-                    "description": description,
-                    "source": source_name,
-                })
+                # Legacy MD5 ID is only computed for entries not already seen under the new ID
+                if seen is not None and (aid in seen or _legacy_article_id(slug, link) in seen):
+                    continue
+                title = _strip_html(str(entry.get("title") or "")).strip() or "No title"
+                description = None
+                if entry["summary"]:
+                    description = _strip_html(str(entry["summary"])).strip() or None
+                ids.append(aid)
+                records.append((title, link, description, source_name))
         except Exception as e:
-            logger.warning("Failed to fetch RSS %s (%s): %s", source_name, url, e)
-    return articles
+            logger.warning("Failed to parse RSS %s (%s): %s", source_name, url, e)
+    return ids, records, cache_updates
@@ -6,16 +6,21 @@ Run once, in a loop, or via cron/launchd (e.g. every 5 minutes).
 """
 
 import argparse
+import atexit
 import logging
 import os
+import signal
 import sys
-import time
+import threading
 
-from dotenv import load_dotenv
-
-from news_notifier import run
-
-load_dotenv()
+from news_notifier import (
+    get_state_path,
+    init_env,
+    load_seen_ids,
+    run,
+    save_seen_ids,
+    trim_seen_ids,
+)
 
 logging.basicConfig(
     level=logging.INFO,
@@ -26,9 +31,19 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 DEFAULT_INTERVAL = 900  # 15 minutes
+MAX_INTERVAL = 3600  # Ceiling for idle backoff
+IDLE_BACKOFF = 1.5  # Sleep grows by this factor per tick with nothing new
+MAX_BACKOFF_STEPS = 20  # Exponent cap; 1.5**20 is far past MAX_INTERVAL and can't overflow
+
+
+def next_sleep(interval: int, idle_ticks: int) -> float:
+    """Seconds to sleep before the next tick: grows while idle, capped at MAX_INTERVAL."""
+    steps = min(idle_ticks, MAX_BACKOFF_STEPS)
+    return min(interval * IDLE_BACKOFF ** steps, max(interval, MAX_INTERVAL))
 
 
 def main() -> None:
+    init_env()
     parser = argparse.ArgumentParser(description="TradingEconomics news → Discord notifier.")
     parser.add_argument(
         "--loop",
@@ -40,7 +55,10 @@ def main() -> None:
         type=int,
         default=int(os.getenv("NOTIFIER_INTERVAL_SECONDS", DEFAULT_INTERVAL)),
         metavar="SECONDS",
-        help="Loop interval in seconds (default: 900). Env: NOTIFIER_INTERVAL_SECONDS.",
+        help=(
+            "Loop interval in seconds (default: 900). Env: NOTIFIER_INTERVAL_SECONDS. "
+            "Ticks with nothing new back off up to 3600s; send SIGHUP to refresh now."
+        ),
     )
     args = parser.parse_args()
 
@@ -49,9 +67,31 @@ def main() -> None:
             logger.warning("Interval %s is under 60s; using 60s to respect rate limits.", args.interval)
             args.interval = 60
         logger.info("Running in loop every %s seconds (Ctrl+C to stop).", args.interval)
+        refresh = threading.Event()
+        if hasattr(signal, "SIGHUP"):  # Not available on Windows
+            signal.signal(signal.SIGHUP, lambda *_: refresh.set())
+        # Keep seen IDs in memory between ticks; run() writes them when a tick adds any
+        # (before the feed cache), and they are saved again on exit (SIGTERM is turned
+        # into SystemExit so atexit handlers run). run() adds an ID only once its post
+        # succeeded, so saving mid-tick is safe.
+        state_path = get_state_path()
+        seen = load_seen_ids(state_path)
+        atexit.register(lambda: save_seen_ids(state_path, seen))
+        signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+        idle_ticks = 0
         while True:
-            run()
-            time.sleep(args.interval)
+            sent = run(state_path=state_path, seen=seen)  # Saves seen IDs if it added any
+            trim_seen_ids(seen)  # Match what a restart would load
+            idle_ticks = 0 if sent else idle_ticks + 1
+            delay = next_sleep(args.interval, idle_ticks)
+            if idle_ticks:
+                logger.info(
+                    "Nothing new for %s tick(s); next check in %.0f seconds.", idle_ticks, delay
+                )
+            if refresh.wait(delay):
+                logger.info("SIGHUP received; refreshing now.")
+                refresh.clear()
+                idle_ticks = 0
     else:
         run()
 